@@ -1,6 +1,9 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
-from imapsync import connect_to_imap, get_message_ids, sync_imap_accounts
+import imapsync
+from imapsync import connect_to_imap, get_message_ids, message_exists_on_target, sync_imap_accounts
 
 class TestImapSync(unittest.TestCase):
     def setUp(self):
@@ -24,28 +27,206 @@ class TestImapSync(unittest.TestCase):
 
     def test_get_message_ids(self):
         self.mock_imap.search.return_value = [1]
-        mock_email = MagicMock()
-        mock_email.__getitem__.return_value = 'test-message-id'
-        
-        with patch('email.message_from_bytes', return_value=mock_email):
+        self.mock_imap.fetch.return_value = {
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <test-message-id>\r\n\r\n'}
+        }
+        message_ids = get_message_ids(self.mock_imap, 'INBOX')
+        self.assertEqual(message_ids, {'<test-message-id>'})
+
+        # Verify only headers were requested, not the full body
+        fetch_fields = self.mock_imap.fetch.call_args[0][1]
+        self.assertNotIn('RFC822', fetch_fields)
+
+        # Test empty folder
+        self.mock_imap.search.return_value = []
+        message_ids = get_message_ids(self.mock_imap, 'INBOX')
+        self.assertEqual(message_ids, set())
+
+    def test_get_message_ids_fetches_in_chunks(self):
+        self.mock_imap.search.return_value = [2, 1]
+        self.mock_imap.fetch.side_effect = [
+            {1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'}},
+            {2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-2>\r\n\r\n'}}
+        ]
+
+        with patch('imapsync.FETCH_CHUNK_SIZE', 1):
+            message_ids = get_message_ids(self.mock_imap, 'INBOX')
+
+        self.assertEqual(message_ids, {'<mid-1>', '<mid-2>'})
+        # Two fetches of one UID each, in ascending UID order
+        self.assertEqual(self.mock_imap.fetch.call_count, 2)
+        self.assertEqual(self.mock_imap.fetch.call_args_list[0][0][0], [1])
+        self.assertEqual(self.mock_imap.fetch.call_args_list[1][0][0], [2])
+
+    def test_get_message_ids_uses_persistent_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = imapsync.MessageIdCache(os.path.join(tmp, 'cache.sqlite'))
+            self.mock_imap.host = 'test.host'
+
+            # First run: full scan of one message
+            self.mock_imap.folder_status.return_value = {b'UIDVALIDITY': 7, b'UIDNEXT': 2}
+            self.mock_imap.search.return_value = [1]
             self.mock_imap.fetch.return_value = {
-                1: {b'RFC822': b'test message content'}
+                1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'}
             }
-            message_ids = get_message_ids(self.mock_imap, 'INBOX')
-            self.assertEqual(message_ids, {'test-message-id'})
-            
-            # Test empty folder
+            message_ids = get_message_ids(self.mock_imap, 'INBOX', cache)
+            self.assertEqual(message_ids, {'<mid-1>'})
+
+            # Second run: one new message; only UIDs >= cached UIDNEXT are fetched
+            self.mock_imap.folder_status.return_value = {b'UIDVALIDITY': 7, b'UIDNEXT': 3}
+            self.mock_imap.search.return_value = [2]
+            self.mock_imap.fetch.return_value = {
+                2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-2>\r\n\r\n'}
+            }
+            message_ids = get_message_ids(self.mock_imap, 'INBOX', cache)
+            self.assertEqual(message_ids, {'<mid-1>', '<mid-2>'})
+            self.mock_imap.search.assert_called_with(['UID', '2:*'])
+            self.assertEqual(self.mock_imap.fetch.call_args[0][0], [2])
+
+            # UIDVALIDITY change invalidates the cache entirely
+            self.mock_imap.folder_status.return_value = {b'UIDVALIDITY': 8, b'UIDNEXT': 1}
             self.mock_imap.search.return_value = []
-            message_ids = get_message_ids(self.mock_imap, 'INBOX')
+            message_ids = get_message_ids(self.mock_imap, 'INBOX', cache)
             self.assertEqual(message_ids, set())
+            self.mock_imap.search.assert_called_with(['ALL'])
+
+            cache.close()
+
+    @unittest.skipIf(imapsync.BloomFilter is None, 'pybloom-live not installed')
+    def test_get_message_ids_uses_bloom_filter_for_large_folders(self):
+        self.mock_imap.search.return_value = [1]
+        self.mock_imap.fetch.return_value = {
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <test-message-id>\r\n\r\n'}
+        }
+
+        with patch('imapsync.BLOOM_FILTER_THRESHOLD', 1):
+            message_ids = get_message_ids(self.mock_imap, 'INBOX')
+
+        self.assertIsInstance(message_ids, imapsync.BloomFilter)
+        self.assertIn('<test-message-id>', message_ids)
+
+        # A Bloom hit must be confirmed with a server-side search
+        self.mock_imap.search.return_value = []
+        self.assertFalse(
+            message_exists_on_target(self.mock_imap, message_ids, '<test-message-id>')
+        )
+        self.mock_imap.search.return_value = [5]
+        self.assertTrue(
+            message_exists_on_target(self.mock_imap, message_ids, '<test-message-id>')
+        )
+
+    def test_extract_message_id_variants(self):
+        # Common case: exact casing, value on the same line (fast path)
+        self.assertEqual(
+            imapsync.extract_message_id(b'Message-ID: <a@b>\r\n\r\n'), '<a@b>')
+        # Unusual casing falls back to the regex
+        self.assertEqual(
+            imapsync.extract_message_id(b'MESSAGE-ID: <a@b>\r\n'), '<a@b>')
+        # Folded header: value on a continuation line
+        self.assertEqual(
+            imapsync.extract_message_id(b'Message-ID:\r\n <a@b>\r\n'), '<a@b>')
+        # No Message-ID at all
+        self.assertIsNone(imapsync.extract_message_id(b'\r\n'))
+        self.assertIsNone(imapsync.extract_message_id(None))
+        # Header name appearing mid-line must not match
+        self.assertIsNone(
+            imapsync.extract_message_id(b'X-Old-Message-ID-Note: keep <x@y>\r\n'))
+
+    def test_iter_folder_message_ids_streams_chunks(self):
+        self.mock_imap.fetch.side_effect = [
+            {1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <m1@x>\r\n'}},
+            {2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'\r\n'}}
+        ]
+
+        with patch('imapsync.FETCH_CHUNK_SIZE', 1):
+            stream = imapsync.iter_folder_message_ids(self.mock_imap, 'INBOX', [2, 1])
+            # Nothing is fetched until the stream is consumed
+            self.mock_imap.fetch.assert_not_called()
+            self.assertEqual(next(stream), (1, '<m1@x>'))
+            self.assertEqual(self.mock_imap.fetch.call_count, 1)
+            self.assertEqual(next(stream), (2, None))
+            self.assertEqual(list(stream), [])
+
+    def test_extract_message_ids_batch(self):
+        header_data = {
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <m1@x>\r\n'},
+            2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'\r\n'},
+            3: {}
+        }
+        self.assertEqual(
+            imapsync.extract_message_ids(header_data),
+            {1: '<m1@x>', 2: None, 3: None}
+        )
+
+    @patch('imapsync.time.sleep')
+    def test_retry_backs_off_on_transient_errors(self, mock_sleep):
+        operation = MagicMock(side_effect=[OSError('reset'), OSError('reset'), 'result'])
+        self.assertEqual(imapsync.retry(operation, 1, 2, description='op'), 'result')
+        self.assertEqual(operation.call_count, 3)
+        operation.assert_called_with(1, 2)
+        # Exponential backoff between attempts
+        self.assertEqual([c[0][0] for c in mock_sleep.call_args_list], [0.5, 1.0])
+
+        # Persistent failures surface after MAX_RETRIES attempts
+        operation = MagicMock(side_effect=OSError('down'))
+        with self.assertRaises(OSError):
+            imapsync.retry(operation, description='op')
+        self.assertEqual(operation.call_count, imapsync.MAX_RETRIES)
+
+        # Non-network errors are not retried
+        operation = MagicMock(side_effect=ValueError('bug'))
+        with self.assertRaises(ValueError):
+            imapsync.retry(operation, description='op')
+        self.assertEqual(operation.call_count, 1)
+
+    def test_deflate_socket_round_trip(self):
+        import zlib
+
+        sent = []
+        fake_sock = MagicMock()
+        fake_sock.sendall.side_effect = sent.append
+
+        sock = imapsync.DeflateSocket(fake_sock)
+        sock.sendall(b'a001 NOOP\r\n')
+        sock.sendall(b'a002 LOGOUT\r\n')
+
+        # Each send is sync-flushed raw deflate the peer can decode as-is
+        decompressor = zlib.decompressobj(-15)
+        self.assertEqual(
+            b''.join(decompressor.decompress(payload) for payload in sent),
+            b'a001 NOOP\r\na002 LOGOUT\r\n'
+        )
+
+        # Inbound data is decompressed transparently, line by line
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        inbound = compressor.compress(b'* OK ready\r\nabc')
+        inbound += compressor.flush(zlib.Z_SYNC_FLUSH)
+        fake_sock.recv.side_effect = [inbound, b'']
+        reader = imapsync.DeflateReader(sock)
+        self.assertEqual(reader.readline(), b'* OK ready\r\n')
+        self.assertEqual(reader.read(3), b'abc')
+
+    def test_enable_compression_requires_capability(self):
+        self.mock_imap.has_capability.return_value = False
+        self.assertFalse(imapsync.enable_compression(self.mock_imap))
+        self.mock_imap._imap._simple_command.assert_not_called()
+
+        self.mock_imap.has_capability.return_value = True
+        self.mock_imap._imap._simple_command.return_value = ('OK', [b'DEFLATE active'])
+        self.assertTrue(imapsync.enable_compression(self.mock_imap))
+        self.mock_imap._imap._simple_command.assert_called_once_with('COMPRESS', 'DEFLATE')
+        self.assertIsInstance(self.mock_imap._imap.sock, imapsync.DeflateSocket)
 
     @patch('imapsync.connect_to_imap')
     def test_sync_imap_accounts(self, mock_connect):
-        # Mock for successful connections
+        # Mock for successful connections; keyed by host because the two
+        # connects run concurrently and may arrive in either order
         mock_source = MagicMock()
         mock_target = MagicMock()
-        mock_connect.side_effect = [mock_source, mock_target]
-        
+        mock_connect.side_effect = lambda host, user, password: {
+            'source.host': mock_source, 'target.host': mock_target
+        }[host]
+
         # Mock folder list
         mock_source.list_folders.return_value = [
             ([], '/', 'INBOX')
@@ -54,24 +235,298 @@ class TestImapSync(unittest.TestCase):
         # Mock messages
         mock_source.search.return_value = [1]
         mock_source.fetch.return_value = {
-            1: {
-                b'RFC822': b'test content',
-                b'FLAGS': ('\\Seen',)
-            }
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'}
         }
-        
+
         # Test synchronization
         sync_imap_accounts(
             'source.host', 'user1', 'pass1',
             'target.host', 'user2', 'pass2',
             dry_run=True
         )
-        
+
         # Verify connections were made
         self.assertEqual(mock_connect.call_count, 2)
-        
+
         # Verify folders were listed
         mock_source.list_folders.assert_called_once()
 
+        # Target folder listing is fetched once, not once per folder
+        mock_target.list_folders.assert_called_once()
+
+        # Dry-run must neither append nor fetch full bodies
+        mock_target.append.assert_not_called()
+        for call in mock_source.fetch.call_args_list:
+            self.assertNotIn('RFC822', call[0][1])
+
+    @patch('imapsync.connect_to_imap')
+    def test_connection_pool_reuses_live_sessions(self, mock_connect):
+        mock_connect.side_effect = lambda host, user, password: MagicMock()
+        pool = imapsync.ImapConnectionPool()
+
+        client = pool.acquire('test.host', 'user', 'pass')
+        self.assertEqual(mock_connect.call_count, 1)
+
+        # A released session that still answers NOOP is handed out again
+        pool.release(client, 'test.host', 'user')
+        self.assertIs(pool.acquire('test.host', 'user', 'pass'), client)
+        self.assertEqual(mock_connect.call_count, 1)
+
+        # A stale session is evicted and replaced with a fresh login
+        client.noop.side_effect = Exception('connection reset')
+        pool.release(client, 'test.host', 'user')
+        replacement = pool.acquire('test.host', 'user', 'pass')
+        self.assertIsNot(replacement, client)
+        self.assertEqual(mock_connect.call_count, 2)
+
+        pool.release(replacement, 'test.host', 'user')
+        pool.close_all()
+        replacement.logout.assert_called_once()
+
+    @patch('imapsync.connect_to_imap')
+    def test_sync_parallel_workers_use_own_connections(self, mock_connect):
+        # 2 main connections plus one pair per folder; connects are keyed
+        # by host since they can arrive in any order across threads
+        source_mocks = []
+        target_mocks = []
+
+        def fake_connect(host, user, password):
+            m = MagicMock()
+            m.search.return_value = []
+            if host == 'source.host':
+                if not source_mocks:
+                    m.list_folders.return_value = [
+                        ([], '/', 'INBOX'),
+                        ([], '/', 'Sent')
+                    ]
+                source_mocks.append(m)
+            else:
+                if not target_mocks:
+                    m.list_folders.return_value = []
+                target_mocks.append(m)
+            return m
+
+        mock_connect.side_effect = fake_connect
+
+        sync_imap_accounts(
+            'source.host', 'user1', 'pass1',
+            'target.host', 'user2', 'pass2',
+            dry_run=True, workers=2
+        )
+
+        self.assertEqual(mock_connect.call_count, 6)
+        # Worker connections are closed again
+        for m in source_mocks[1:] + target_mocks[1:]:
+            m.logout.assert_called_once()
+
+    @patch('imapsync.connect_to_imap')
+    def test_sync_fetches_bodies_only_for_missing(self, mock_connect):
+        mock_source = MagicMock()
+        mock_target = MagicMock()
+        mock_connect.side_effect = lambda host, user, password: {
+            'source.host': mock_source, 'target.host': mock_target
+        }[host]
+
+        mock_source.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.list_folders.return_value = [([], '/', 'INBOX')]
+
+        # Target already holds <mid-1>; only <mid-2> is missing
+        mock_target.search.return_value = [1]
+        mock_target.fetch.return_value = {
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'}
+        }
+
+        mock_source.search.return_value = [1, 2]
+        header_response = {
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'},
+            2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-2>\r\n\r\n'}
+        }
+        body_response = {
+            2: {b'RFC822': b'test content', b'FLAGS': ('\\Seen',)}
+        }
+        mock_source.fetch.side_effect = [header_response, body_response]
+        mock_target.has_capability.return_value = False
+
+        sync_imap_accounts(
+            'source.host', 'user1', 'pass1',
+            'target.host', 'user2', 'pass2'
+        )
+
+        # Body fetch was issued only for the missing message
+        self.assertEqual(mock_source.fetch.call_count, 2)
+        self.assertEqual(mock_source.fetch.call_args_list[1][0][0], [2])
+        mock_target.append.assert_called_once_with(
+            'INBOX', b'test content', flags=('\\Seen',)
+        )
+
+        # Body references are dropped as soon as the message is appended
+        self.assertEqual(body_response, {})
+
+    def test_sync_folder_same_account_uses_server_side_copy(self):
+        mock_source = MagicMock()
+        mock_target = MagicMock()
+
+        mock_target.search.return_value = []
+        mock_source.search.return_value = [1]
+        mock_source.fetch.return_value = {
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'}
+        }
+
+        imapsync.sync_folder(
+            mock_source, mock_target, 'same.host', 'INBOX',
+            use_copy=True
+        )
+
+        # The message is duplicated server-side; no body crosses the wire
+        mock_source.copy.assert_called_once_with([1], 'INBOX')
+        mock_target.append.assert_not_called()
+        for call in mock_source.fetch.call_args_list:
+            self.assertNotIn('RFC822', call[0][1])
+
+    @patch('imapsync.connect_to_imap')
+    def test_sync_server_search_probes_target_per_message(self, mock_connect):
+        mock_source = MagicMock()
+        mock_target = MagicMock()
+        mock_connect.side_effect = lambda host, user, password: {
+            'source.host': mock_source, 'target.host': mock_target
+        }[host]
+
+        mock_source.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.has_capability.return_value = False
+
+        # <mid-1> exists on the target, <mid-2> does not
+        mock_target.search.side_effect = [[7], []]
+
+        mock_source.search.return_value = [1, 2]
+        mock_source.fetch.side_effect = [
+            {
+                1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'},
+                2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-2>\r\n\r\n'}
+            },
+            {2: {b'RFC822': b'new content', b'FLAGS': ()}}
+        ]
+
+        sync_imap_accounts(
+            'source.host', 'user1', 'pass1',
+            'target.host', 'user2', 'pass2',
+            server_search=True
+        )
+
+        # No upfront target scan, only per-message probes
+        mock_target.fetch.assert_not_called()
+        self.assertEqual(mock_target.search.call_args_list[0][0][0],
+                         ['HEADER', 'Message-ID', '<mid-1>'])
+        self.assertEqual(mock_target.search.call_args_list[1][0][0],
+                         ['HEADER', 'Message-ID', '<mid-2>'])
+        mock_target.append.assert_called_once_with('INBOX', b'new content', flags=())
+
+    @patch('imapsync.connect_to_imap')
+    def test_sync_since_uid_and_no_flags(self, mock_connect):
+        mock_source = MagicMock()
+        mock_target = MagicMock()
+        mock_connect.side_effect = lambda host, user, password: {
+            'source.host': mock_source, 'target.host': mock_target
+        }[host]
+
+        mock_source.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.search.return_value = []
+        mock_target.has_capability.return_value = False
+
+        mock_source.search.return_value = [6]
+        mock_source.fetch.side_effect = [
+            {6: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-6>\r\n\r\n'}},
+            {6: {b'RFC822': b'new content'}}
+        ]
+
+        sync_imap_accounts(
+            'source.host', 'user1', 'pass1',
+            'target.host', 'user2', 'pass2',
+            since_uid=5, preserve_flags=False
+        )
+
+        # Source scan is restricted to UIDs above since_uid
+        mock_source.search.assert_called_once_with(['UID', '6:*'])
+        # No FLAGS fetch, and the copy takes default flags
+        self.assertEqual(mock_source.fetch.call_args_list[1][0][1], ['RFC822'])
+        mock_target.append.assert_called_once_with('INBOX', b'new content', flags=())
+
+    @patch('imapsync.connect_to_imap')
+    def test_sync_deduplicates_messages_without_message_id_by_hash(self, mock_connect):
+        mock_source = MagicMock()
+        mock_target = MagicMock()
+        mock_connect.side_effect = lambda host, user, password: {
+            'source.host': mock_source, 'target.host': mock_target
+        }[host]
+
+        mock_source.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.has_capability.return_value = False
+
+        # Target holds one message without a Message-ID
+        mock_target.search.return_value = [1]
+        mock_target.fetch.side_effect = [
+            {1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'\r\n'}},
+            {1: {b'BODY[]': b'duplicate body'}}
+        ]
+
+        # Source holds the same message plus a new one, both without IDs
+        mock_source.search.return_value = [1, 2]
+        mock_source.fetch.side_effect = [
+            {
+                1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'\r\n'},
+                2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'\r\n'}
+            },
+            {
+                1: {b'RFC822': b'duplicate body', b'FLAGS': ()},
+                2: {b'RFC822': b'new body', b'FLAGS': ()}
+            }
+        ]
+
+        sync_imap_accounts(
+            'source.host', 'user1', 'pass1',
+            'target.host', 'user2', 'pass2'
+        )
+
+        # Only the unseen body is copied
+        mock_target.append.assert_called_once_with('INBOX', b'new body', flags=())
+
+    @patch('imapsync.connect_to_imap')
+    def test_sync_batches_appends_with_multiappend(self, mock_connect):
+        mock_source = MagicMock()
+        mock_target = MagicMock()
+        mock_connect.side_effect = lambda host, user, password: {
+            'source.host': mock_source, 'target.host': mock_target
+        }[host]
+
+        mock_source.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.list_folders.return_value = [([], '/', 'INBOX')]
+        mock_target.search.return_value = []
+        mock_target.has_capability.return_value = True
+
+        mock_source.search.return_value = [1, 2]
+        header_response = {
+            1: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-1>\r\n\r\n'},
+            2: {b'BODY[HEADER.FIELDS (MESSAGE-ID)]': b'Message-ID: <mid-2>\r\n\r\n'}
+        }
+        body_response = {
+            1: {b'RFC822': b'content 1', b'FLAGS': ()},
+            2: {b'RFC822': b'content 2', b'FLAGS': ('\\Seen',)}
+        }
+        mock_source.fetch.side_effect = [header_response, body_response]
+
+        sync_imap_accounts(
+            'source.host', 'user1', 'pass1',
+            'target.host', 'user2', 'pass2'
+        )
+
+        # Both messages went out in a single MULTIAPPEND, no per-message APPENDs
+        mock_target.append.assert_not_called()
+        mock_target.multiappend.assert_called_once_with('INBOX', [
+            {'msg': b'content 1', 'flags': ()},
+            {'msg': b'content 2', 'flags': ('\\Seen',)}
+        ])
+
 if __name__ == '__main__':
     unittest.main()